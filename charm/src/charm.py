@@ -4,27 +4,45 @@
 
 """Charm the application."""
 
-from subprocess import run
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict
+from typing import Any, Dict, Set
 
 import ops
 
-from config import ConfigValidator, ConfigManager
+from commands import run_command
+from config import CollectorConfig, ConfigValidator, ConfigManager, redact_secrets
 from service_manager import ServiceManager
 from github_client import GitHubClient
 from file_manager import FileManager
 
 logger = logging.getLogger(__name__)
 
+# Options that require fetching the collector again when they change
+FETCH_KEYS = frozenset({"release_tag", "github_repo", "sub_directory"})
+# Options written to the collector's environment file
+ENV_KEYS = frozenset({"haproxy_url", "haproxy_username", "haproxy_password"})
+
 class CollectorCharm(ops.CharmBase):
     """Charm the application."""
 
+    _stored = ops.StoredState()
+
     def __init__(self, framework: ops.Framework):
         super().__init__(framework)
 
+        # Set when the unit files are rewritten so the next start or restart
+        # reloads systemd and re-enables them
+        self._stored.set_default(units_dirty=False)
+
+        # (type, message) of the last status set by this hook
+        self._last_status = None
+
         # Initialize managers
         self.config_manager = ConfigManager(self.model.config)
-        self.service_manager = ServiceManager(lambda status: setattr(self.model.unit, 'status', status))
+        self.service_manager = ServiceManager(self._set_status)
 
         framework.observe(self.on.install, self._on_install)
         framework.observe(self.on.config_changed, self._on_config_changed)
@@ -38,15 +56,14 @@ class CollectorCharm(ops.CharmBase):
         config = self.config_manager.get_config()
         try:
             logger.info("Validating configuration...")
-            self.model.unit.status = ops.MaintenanceStatus("Validating configuration...")
+            self._set_status(ops.MaintenanceStatus("Validating configuration..."))
 
             ConfigValidator.validate_config(config)
 
             logger.info("Configuration validated successfully.")
-            self.model.unit.status = ops.MaintenanceStatus("Configuration validated successfully.")
         except ValueError as e:
-            logger.error(f"Configuration validation failed: {e}")
-            self.model.unit.status = ops.BlockedStatus(f"Configuration error: {e}")
+            logger.error("Configuration validation failed: %s", e)
+            self._set_status(ops.BlockedStatus(f"Configuration error: {e}"))
             return
 
         # Store the configuration
@@ -58,174 +75,217 @@ class CollectorCharm(ops.CharmBase):
         try:
             # Install dependencies
             logger.info("Installing dependencies...")
-            self.model.unit.status = ops.MaintenanceStatus("Installing dependencies...")
-            run(["apt", "install", "-y", "python3-pip"])
-            run(["apt", "install", "-y", "python-is-python3"])
+            self._set_status(ops.MaintenanceStatus("Installing dependencies..."))
+            run_command(
+                ["apt-get", "install", "-y", "--no-install-recommends",
+                 "python3-pip", "python-is-python3"],
+                env={**os.environ, "DEBIAN_FRONTEND": "noninteractive"},
+            )
 
             logger.info("Dependencies installed successfully.")
-            self.model.unit.status = ops.ActiveStatus("Running")
+            self._set_status(ops.ActiveStatus("Running"))
         except Exception as e:
-            logger.error(f"Failed to install dependencies: {e}")
-            self.model.unit.status = ops.BlockedStatus(f"Dependency installation failed: {e}")
+            logger.error("Failed to install dependencies: %s", e)
+            self._set_status(ops.BlockedStatus(f"Dependency installation failed: {e}"))
             return
 
     def _on_config_changed(self, event: ops.ConfigChangedEvent):
         """Handle configuration changes."""
         logger.info("Configuration changed, updating...")
-        self.model.unit.status = ops.MaintenanceStatus("Updating configuration...")
+        self._set_status(ops.MaintenanceStatus("Updating configuration..."))
 
         # Read the old and new configurations
         old_config = FileManager.read_config()
         new_config = self.config_manager.get_config()
 
-        logger.info(f"Old configuration: {old_config}")
-        logger.info(f"New configuration: {new_config}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Old configuration: %s", redact_secrets(old_config))
+            logger.info("New configuration: %s", redact_secrets(asdict(new_config)))
 
         try:
             # Validate the new configuration
             ConfigValidator.validate_config(new_config)
         except ValueError as e:
-            logger.error(f"Configuration validation failed: {e}")
-            self.model.unit.status = ops.BlockedStatus(f"Configuration error: {e}")
+            logger.error("Configuration validation failed: %s", e)
+            self._set_status(ops.BlockedStatus(f"Configuration error: {e}"))
             return
 
         # Check for changes in the configuration
-        changed_configs = {field: new_config[field] for field in new_config if old_config.get(field) != new_config[field]}
+        changed_keys = self._diff_config(old_config, new_config)
 
         # If there are changes, update the configuration and generate the environment file
-        if changed_configs:
-            logger.info(f"Configuration changed: {changed_configs}")
-            FileManager.store_config(new_config)
+        if changed_keys:
+            logger.info("Configuration changed: %s", ", ".join(sorted(changed_keys)))
 
-            if ("release_tag" in changed_configs or "github_repo" in changed_configs or "sub_directory" in changed_configs):
+            if FETCH_KEYS & changed_keys:
                 # Fetch the collector from GitHub if the release tag, repo or sub-directory has changed
                 try:
                     GitHubClient.fetch_collector(new_config)
                     logger.info("Collector fetched successfully.")
 
-                    self.unit.set_workload_version(new_config.get("release_tag"))
+                    self.unit.set_workload_version(new_config.release_tag)
                 except Exception as e:
-                    logger.error(f"Failed to fetch collector: {e}")
-                    self.model.unit.status = ops.BlockedStatus(f"Failed to fetch collector: {e}")
+                    logger.error("Failed to fetch collector: %s", e)
+                    self._set_status(ops.BlockedStatus(f"Failed to fetch collector: {e}"))
                     return
 
-            if "haproxy_url" in changed_configs or "haproxy_username" in changed_configs or "haproxy_password" in changed_configs:
+                # The fetched collector may need different requirements
+                try:
+                    FileManager.install_dependencies()
+                except Exception as e:
+                    logger.error("Failed to install dependencies: %s", e)
+                    self._set_status(ops.BlockedStatus(f"Dependency installation failed: {e}"))
+                    return
+
+            if ENV_KEYS & changed_keys:
                 # Generate the environment file
                 FileManager.generate_environment_file(new_config)
             
+            # Store the configuration only once it has been applied, so that a
+            # change that failed halfway is retried when it comes back
+            FileManager.store_config(new_config, durable=True)
             logger.info("Configuration updated successfully.")
             self._on_service_restart(event)
         else:
             logger.info("No configuration changes detected.")
-            self.model.unit.status = ops.ActiveStatus("Running")
+            self._set_status(ops.ActiveStatus("Running"))
 
     def _on_service_start(self, event: ops.ActionEvent):
         """Start the collector service."""
         try:
-            self.set_status(ops.MaintenanceStatus("Starting service..."))
-            self.service_manager.start_service()
-            self.set_status(ops.ActiveStatus("Running"))
+            self._set_status(ops.MaintenanceStatus("Starting service..."))
+            self.service_manager.start_service(reload_units=self._stored.units_dirty)
+            self._stored.units_dirty = False
+            self._set_status(ops.ActiveStatus("Running"))
         except Exception as e:
-            logger.error(f"Failed to start service: {e}")
-            self.set_status(ops.BlockedStatus(f"Service start failed: {e}"))
+            logger.error("Failed to start service: %s", e)
+            self._set_status(ops.BlockedStatus(f"Service start failed: {e}"))
             return
         
     def _on_service_stop(self, event: ops.ActionEvent):
         """Stop the collector service."""
         try:
-            self.set_status(ops.MaintenanceStatus("Stopping service..."))
+            self._set_status(ops.MaintenanceStatus("Stopping service..."))
             self.service_manager.stop_service()
-            self.set_status(ops.BlockedStatus("Stopped"))
+            # The units are disabled now, so they must be enabled again on restart
+            self._stored.units_dirty = True
+            self._set_status(ops.BlockedStatus("Stopped"))
         except Exception as e:
-            logger.error(f"Failed to stop service: {e}")
-            self.set_status(ops.BlockedStatus(f"Service stop failed: {e}"))
+            logger.error("Failed to stop service: %s", e)
+            self._set_status(ops.BlockedStatus(f"Service stop failed: {e}"))
             return
     
     def _on_service_restart(self, event):
         """Restart the collector service."""
         try:
-            self.set_status(ops.MaintenanceStatus("Restarting service..."))
-            self.service_manager.restart_service()
-            self.set_status(ops.ActiveStatus("Running"))
+            self._set_status(ops.MaintenanceStatus("Restarting service..."))
+            self.service_manager.restart_service(reload_units=self._stored.units_dirty)
+            self._stored.units_dirty = False
+            self._set_status(ops.ActiveStatus("Running"))
         except Exception as e:
-            logger.error(f"Failed to restart service: {e}")
-            self.set_status(ops.BlockedStatus(f"Service restart failed: {e}"))
+            logger.error("Failed to restart service: %s", e)
+            self._set_status(ops.BlockedStatus(f"Service restart failed: {e}"))
             return
 
     def _on_reload(self, event: ops.ActionEvent):
         """Refresh the collector service."""
-        self.model.unit.status = ops.MaintenanceStatus("Refreshing collector service...")
+        self._set_status(ops.MaintenanceStatus("Refreshing collector service..."))
         logger.info("Refreshing collector service with new configuration...")
 
+        old_config = FileManager.read_config()
         config = self.config_manager.get_config()
 
         # Validate the configuration
-        self.model.unit.status = ops.MaintenanceStatus("Validating configuration...")
         logger.info("Validating configuration...")
         ConfigValidator.validate_config(config)
         logger.info("Configuration validated successfully.")
-        
-        # Store the configuration
-        self.model.unit.status = ops.MaintenanceStatus("Storing configuration...")
-        logger.info("Storing configuration...")
-        FileManager.store_config(config)
-        logger.info("Configuration stored successfully.")
-
-        # Stop the service
-        logger.info("Stopping collector service...")
-        self.service_manager.stop_service()
-        logger.info("Collector service stopped successfully.")
 
-        try:
-            # Fetch the collector from GitHub if needed
-            self.model.unit.status = ops.MaintenanceStatus("Fetching collector from GitHub...")
-            logger.info("Fetching collector from GitHub...")
-            GitHubClient.fetch_collector(config)
-            logger.info("Collector fetched successfully.")
-        except Exception as e:
-            logger.error(f"Failed to fetch collector: {e}")
-            self.model.unit.status = ops.BlockedStatus(f"Failed to fetch collector from Github: {e}")
-            return
+        changed_keys = self._diff_config(old_config, config)
+
+        # Only fetch the collector again if its source changed or it is missing
+        refetch = bool(FETCH_KEYS & changed_keys)
+        refetch = refetch or not os.path.isdir(FileManager.DEST_DIR)
+
+        # Assume the unit files change until their generation has succeeded
+        units_were_dirty = self._stored.units_dirty
+        self._stored.units_dirty = True
+
+        # The fetch is network bound and independent of the generated files,
+        # so run them side by side
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            units_future = executor.submit(FileManager.generate_service_file, config)
+            futures = {
+                executor.submit(FileManager.generate_environment_file, config):
+                    "Service refresh failed",
+                units_future: "Service refresh failed",
+            }
+            if refetch:
+                logger.info("Fetching collector from GitHub...")
+                futures[executor.submit(GitHubClient.fetch_collector, config)] = (
+                    "Failed to fetch collector from Github"
+                )
+            else:
+                logger.info("Collector source unchanged, skipping fetch.")
+
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error("%s: %s", futures[future], e)
+                    self._set_status(ops.BlockedStatus(f"{futures[future]}: {e}"))
+                    return
+        logger.info("Collector files generated successfully.")
+        self._stored.units_dirty = units_were_dirty or units_future.result()
 
-        # Install dependencies
-        self.model.unit.status = ops.MaintenanceStatus("Installing dependencies...")
+        # Install dependencies, which needs the fetched requirements.txt. This
+        # runs on every reload: it is a no-op while the requirements are
+        # unchanged, and reload is how an operator recovers a broken install.
         logger.info("Installing dependencies...")
         try:
             FileManager.install_dependencies()
             logger.info("Dependencies installed successfully.")
         except Exception as e:
-            logger.error(f"Failed to install dependencies: {e}")
-            self.model.unit.status = ops.BlockedStatus(f"Dependency installation failed: {e}")
+            logger.error("Failed to install dependencies: %s", e)
+            self._set_status(ops.BlockedStatus(f"Dependency installation failed: {e}"))
             return
 
-        try:
-            # Generate the environment file
-            self.model.unit.status = ops.MaintenanceStatus("Generating environment file...")
-            logger.info("Generating environment file...")
-            FileManager.generate_environment_file(config)
-            logger.info("Environment file generated successfully.")
-
-            # Generate the service file
-            self.model.unit.status = ops.MaintenanceStatus("Generating service file...")
-            logger.info("Generating service file...")
-            FileManager.generate_service_file(config)
-            logger.info("Service file generated successfully.")
+        # Store the configuration only now, so that a failed fetch or install
+        # still shows up as a change on the next reload and is retried
+        logger.info("Storing configuration...")
+        FileManager.store_config(config, durable=True)
+        logger.info("Configuration stored successfully.")
 
+        try:
             # Set the workload version
             logger.info("Setting workload version...")
-            self.unit.set_workload_version(config.get("release_tag"))
+            self.unit.set_workload_version(config.release_tag)
             logger.info("Workload version set successfully.")
 
-            # Start the service
-            self.service_manager.start_service()
+            # Restart the service so it picks up the new files
+            self.service_manager.restart_service(reload_units=self._stored.units_dirty)
+            self._stored.units_dirty = False
 
             # Update the status
-            self.model.unit.status = ops.ActiveStatus("Running")
+            self._set_status(ops.ActiveStatus("Running"))
             logger.info("Collector service refreshed successfully.")
         except Exception as e:
-            logger.error(f"Failed to refresh collector service: {e}")
-            self.model.unit.status = ops.BlockedStatus(f"Service refresh failed: {e}")
+            logger.error("Failed to refresh collector service: %s", e)
+            self._set_status(ops.BlockedStatus(f"Service refresh failed: {e}"))
             return
 
+    def _set_status(self, status: ops.StatusBase) -> None:
+        """Set the unit status, skipping writes that would not change it."""
+        key = (type(status), status.message)
+        if key != self._last_status:
+            self.model.unit.status = status
+            self._last_status = key
+
+    @staticmethod
+    def _diff_config(old_config: Dict[str, Any], new_config: CollectorConfig) -> Set[str]:
+        """Return the names of the fields that differ from the stored configuration."""
+        return {
+            field for field, value in asdict(new_config).items() if old_config.get(field) != value
+        }
+
 if __name__ == "__main__":  # pragma: nocover
     ops.main(CollectorCharm)  # type: ignore
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# Copyright 2024 Adrian Wennström
+# See LICENSE file for licensing details.
+
+"""Subprocess helpers for the collector charm."""
+
+import logging
+import subprocess
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+
+def run_command(args: List[str], check: bool = True, **kwargs) -> subprocess.CompletedProcess:
+    """Run a command without forwarding its output to the hook log.
+
+    stdout is discarded and stderr is captured, so only the output of
+    failing commands ends up in the log.
+
+    Args:
+        args: Command line to execute
+        check: Raise if the command exits with a non-zero status
+        **kwargs: Additional arguments passed to subprocess.run
+
+    Raises:
+        CalledProcessError: If the command fails and check is set
+    """
+    result = subprocess.run(
+        args,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        **kwargs,
+    )
+    if result.returncode != 0:
+        logger.error(
+            "%s exited with status %d: %s", args[0], result.returncode, result.stderr.strip()
+        )
+        if check:
+            raise subprocess.CalledProcessError(result.returncode, args, stderr=result.stderr)
+    return result
@@ -5,46 +5,103 @@
 """Configuration management for the collector charm."""
 
 import logging
-from typing import Dict, Any
+from dataclasses import dataclass
+from operator import attrgetter
+from typing import Any, Callable, Dict, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
 
+# Maps CollectorConfig fields to the charm's config option names
+FIELD_MAP = (
+    ("frequency", "frequency"),
+    ("collector_name", "collector-name"),
+    ("haproxy_name", "haproxy-name"),
+    ("haproxy_url", "haproxy-url"),
+    ("haproxy_username", "haproxy-username"),
+    ("haproxy_password", "haproxy-password"),
+    ("github_repo", "github-repo"),
+    ("github_token", "github-token"),
+    ("release_tag", "release-tag"),
+    ("sub_directory", "sub-directory"),
+)
+
+REQUIRED_FIELDS = (
+    "frequency",
+    "collector_name",
+    "haproxy_name",
+    "haproxy_url",
+    "haproxy_username",
+    "haproxy_password",
+    "github_repo",
+    "github_token",
+    "release_tag",
+)
+
+# Options whose values must never end up in the logs
+SECRET_FIELDS = frozenset({"github_token", "haproxy_password"})
+
+# URL schemes accepted for the HAProxy stats endpoint
+_HTTP_PREFIXES = ("http://", "https://")
+
+# (field, predicate, error) checks, applied in order; the URL checks come
+# last so they only ever see non-empty values
+CHECKS: Tuple[Tuple[str, Callable[[Any], bool], str], ...] = (
+    *(
+        (field, bool, f"The '{option}' configuration option is required.")
+        for field, option in FIELD_MAP
+        if field in REQUIRED_FIELDS
+    ),
+    ("haproxy_url", lambda url: url.startswith(_HTTP_PREFIXES),
+     "The 'haproxy-url' must be a valid URL starting with 'http' or 'https'."),
+    ("github_repo", lambda url: url.startswith("https://"),
+     "The 'github-repo' must be a valid HTTPS URL."),
+)
+
+# Fetches the value of every check from a CollectorConfig in a single call
+_get_checked_values = attrgetter(*(field for field, _, _ in CHECKS))
+
+
+def redact_secrets(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a shallow copy of ``config`` with secret values masked for logging."""
+    return {
+        field: "********" if field in SECRET_FIELDS and value else value
+        for field, value in config.items()
+    }
+
+
+@dataclass(frozen=True, slots=True)
+class CollectorConfig:
+    """Snapshot of the charm configuration for a single event."""
+
+    frequency: int = 60
+    collector_name: Optional[str] = None
+    haproxy_name: Optional[str] = None
+    haproxy_url: Optional[str] = None
+    haproxy_username: Optional[str] = None
+    haproxy_password: Optional[str] = None
+    github_repo: Optional[str] = None
+    github_token: Optional[str] = None
+    release_tag: Optional[str] = None
+    sub_directory: Optional[str] = None
+
+
 class ConfigValidator:
     """Handles configuration validation for the collector charm."""
     
     @staticmethod
-    def validate_config(config: Dict[str, Any]) -> None:
+    def validate_config(config: CollectorConfig) -> None:
         """Validate the configuration.
         
         Args:
-            config: Configuration dictionary to validate
+            config: Configuration to validate
             
         Raises:
             ValueError: If configuration is invalid
         """
-        required_fields = [
-            ("frequency", "The 'frequency' configuration option is required."),
-            ("collector_name", "The 'collector-name' configuration option is required."),
-            ("haproxy_name", "The 'haproxy-name' configuration option is required."),
-            ("haproxy_url", "The 'haproxy-url' configuration option is required."),
-            ("haproxy_username", "The 'haproxy-username' configuration option is required."),
-            ("haproxy_password", "The 'haproxy-password' configuration option is required."),
-            ("github_repo", "The 'github-repo' configuration option is required."),
-            ("github_token", "The 'github-token' configuration option is required."),
-            ("release_tag", "The 'release-tag' configuration option is required."),
-        ]
-        
-        for field, error_msg in required_fields:
-            if not config.get(field):
+        for (_, is_valid, error_msg), value in zip(CHECKS, _get_checked_values(config)):
+            if not is_valid(value):
                 raise ValueError(error_msg)
-        
-        # Validate URL formats
-        if not config.get("haproxy_url", "").startswith("http"):
-            raise ValueError("The 'haproxy-url' must be a valid URL starting with 'http' or 'https'.")
-        
-        if not config.get("github_repo", "").startswith("https://"):
-            raise ValueError("The 'github-repo' must be a valid HTTPS URL.")
 
 
 class ConfigManager:
@@ -53,22 +110,25 @@ class ConfigManager:
     def __init__(self, model_config):
         """Initialize with model config object."""
         self.model_config = model_config
+        # A new manager is created for every dispatched event, so this
+        # caches the configuration for the lifetime of a single hook.
+        self._config = None
     
-    def get_config(self) -> Dict[str, Any]:
-        """Get the configuration as a dictionary.
+    def get_config(self) -> CollectorConfig:
+        """Get the configuration.
         
         Returns:
-            Dictionary containing all configuration values
+            CollectorConfig containing all configuration values
         """
-        return {
-            "frequency": self.model_config.get("frequency", 60),
-            "collector_name": self.model_config.get("collector-name"),
-            "haproxy_name": self.model_config.get("haproxy-name"),
-            "haproxy_url": self.model_config.get("haproxy-url"),
-            "haproxy_username": self.model_config.get("haproxy-username"),
-            "haproxy_password": self.model_config.get("haproxy-password"),
-            "github_repo": self.model_config.get("github-repo"),
-            "github_token": self.model_config.get("github-token"),
-            "release_tag": self.model_config.get("release-tag"),
-            "sub_directory": self.model_config.get("sub-directory"),
-        }
+        if self._config is None:
+            self._config = self._build_config()
+        return self._config
+
+    def _build_config(self) -> CollectorConfig:
+        """Read every charm option from the model config."""
+        # Copy the options once instead of going through the model's mapping
+        # for every field; unset options fall back to the CollectorConfig defaults
+        options = dict(self.model_config)
+        return CollectorConfig(**{
+            field: options[option] for field, option in FIELD_MAP if option in options
+        })
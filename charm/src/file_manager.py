@@ -4,35 +4,123 @@
 
 """File and environment management for the collector charm."""
 
+import hashlib
 import json
 import logging
 import os
-from typing import Dict, Any
+import stat
+import tempfile
+from contextlib import contextmanager, suppress
+from dataclasses import asdict
+from typing import Dict, Any, Iterator, IO, Optional
+
+from commands import run_command
+from config import CollectorConfig
+from templates import render_service, render_timer
 
 logger = logging.getLogger(__name__)
 
+# The charm's root directory, which is also the working directory of every hook
+CHARM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@contextmanager
+def _atomic_open(
+    path: str, mode: str = "w", durable: bool = False, permissions: Optional[int] = None
+) -> Iterator[IO]:
+    """Write to a temporary file and move it over ``path`` once writing succeeded.
+
+    Readers never see a truncated or half-written file, even if the hook is
+    interrupted. With ``durable`` the data is fsync'ed before the rename. The
+    file gets ``permissions`` if given; otherwise it keeps the mode of the one
+    it replaces, or 0o644 if it is new.
+    """
+    if permissions is None:
+        try:
+            permissions = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            permissions = 0o644
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, mode) as tmp_file:
+            yield tmp_file
+            if durable:
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+        os.chmod(tmp_path, permissions)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(tmp_path)
+        raise
+
+
+def _write_if_changed(path: str, data: bytes, permissions: Optional[int] = None) -> bool:
+    """Atomically replace ``path`` with ``data`` unless it already holds exactly that.
+
+    Args:
+        path: File to write
+        data: Complete new contents of the file
+        permissions: Mode of the file, even if its contents are unchanged; by
+            default the mode of the existing file is kept
+
+    Returns:
+        Whether the file was written
+    """
+    try:
+        # Only read the file back when the size matches
+        if os.path.getsize(path) == len(data):
+            with open(path, "rb") as existing_file:
+                if existing_file.read() == data:
+                    mode = stat.S_IMODE(os.fstat(existing_file.fileno()).st_mode)
+                    if permissions is not None and mode != permissions:
+                        os.chmod(path, permissions)
+                    return False
+    except FileNotFoundError:
+        pass
+
+    with _atomic_open(path, "wb", permissions=permissions) as new_file:
+        new_file.write(data)
+    return True
+
 
 class FileManager:
     """Handles file operations for the collector charm."""
     
-    CONFIG_DIR = ".collector"
-    CONFIG_FILE = ".collector/config.json"
+    CONFIG_DIR = os.path.join(CHARM_DIR, ".collector")
+    CONFIG_FILE = os.path.join(CONFIG_DIR, "config.json")
     ENV_FILE_PATH = "/etc/default/collector_envs"
     DEST_DIR = "/opt/collector"
+    REQUIREMENTS_HASH_FILE = os.path.join(CONFIG_DIR, "requirements.hash")
+    PIP_CACHE_DIR = "/var/cache/charm-pip"
+
+    # (st_mtime_ns, parsed config) of the last config file read
+    _config_cache = (None, None)
     
     @classmethod
-    def store_config(cls, config: Dict[str, Any]) -> None:
+    def store_config(cls, config: CollectorConfig, durable: bool = False) -> None:
         """Store the configuration in a file.
+
+        The file is replaced atomically, so it is never left half-written.
         
         Args:
-            config: Configuration dictionary to store
+            config: Configuration to store
+            durable: fsync the file before replacing the old one
         """
-        from subprocess import run
-        
+        new_config = asdict(config)
+        if os.path.exists(cls.CONFIG_FILE) and cls.read_config() == new_config:
+            logger.info("Stored configuration is up to date.")
+            # A file stored by an older charm may still be world-readable
+            os.chmod(cls.CONFIG_FILE, 0o600)
+            return
+
         # Store configuration in .collector folder
-        run(["mkdir", "-p", cls.CONFIG_DIR])
-        with open(cls.CONFIG_FILE, "w") as config_file:
-            config_file.write(json.dumps(config))
+        os.makedirs(cls.CONFIG_DIR, exist_ok=True)
+        # The stored configuration contains the GitHub token
+        with _atomic_open(cls.CONFIG_FILE, durable=durable, permissions=0o600) as config_file:
+            json.dump(new_config, config_file, separators=(",", ":"))
+        cls._config_cache = (None, None)
     
     @classmethod
     def read_config(cls) -> Dict[str, Any]:
@@ -41,65 +129,104 @@ class FileManager:
         Returns:
             Configuration dictionary, empty dict if file not found
         """
+        try:
+            mtime = os.stat(cls.CONFIG_FILE).st_mtime_ns
+        except FileNotFoundError:
+            logger.error("Configuration file not found.")
+            return {}
+
+        cached_mtime, cached_config = cls._config_cache
+        if cached_config is not None and cached_mtime == mtime:
+            return cached_config.copy()
+
         try:
             with open(cls.CONFIG_FILE, "r") as config_file:
-                return json.loads(config_file.read())
+                config = json.load(config_file)
         except FileNotFoundError:
             logger.error("Configuration file not found.")
             return {}
         except json.JSONDecodeError:
             logger.error("Error decoding configuration file.")
             return {}
+
+        cls._config_cache = (mtime, config)
+        return config.copy()
     
     @classmethod
-    def generate_environment_file(cls, config: Dict[str, Any]) -> None:
+    def generate_environment_file(cls, config: CollectorConfig) -> None:
         """Generate the environment file for the collector service.
         
         Args:
-            config: Configuration dictionary containing HAProxy credentials
+            config: Configuration containing HAProxy credentials
         """
-        with open(cls.ENV_FILE_PATH, "w") as env_file:
-            env_file.write(f"HAPROXY_URL={config['haproxy_url']}\n")
-            env_file.write(f"HAPROXY_USERNAME={config['haproxy_username']}\n")
-            env_file.write(f"HAPROXY_PASSWORD={config['haproxy_password']}\n")
+        env = (
+            f"HAPROXY_URL={config.haproxy_url}\n"
+            f"HAPROXY_USERNAME={config.haproxy_username}\n"
+            f"HAPROXY_PASSWORD={config.haproxy_password}\n"
+        )
 
-        logger.info(f"Environment file created at {cls.ENV_FILE_PATH}")
+        # The environment file contains the HAProxy password
+        if _write_if_changed(cls.ENV_FILE_PATH, env.encode(), permissions=0o600):
+            logger.info("Environment file created at %s", cls.ENV_FILE_PATH)
+        else:
+            logger.info("Environment file %s is up to date", cls.ENV_FILE_PATH)
     
     @classmethod
-    def generate_service_file(cls, config: Dict[str, Any]) -> None:
+    def generate_service_file(cls, config: CollectorConfig) -> bool:
         """Generate the service file for the collector.
+
+        The caller is responsible for reloading the systemd daemon afterwards.
         
         Args:
-            config: Configuration dictionary containing service settings
+            config: Configuration containing service settings
+
+        Returns:
+            Whether the service or timer file changed
         """
-        from subprocess import run
-        from templates import SERVICE_TEMPLATE, TIMER_TEMPLATE
-        
         service_file_path = "/etc/systemd/system/collector.service"
         entrypoint = f"python3 {cls.DEST_DIR}/main.py"
 
-        with open(service_file_path, "w") as service_file:
-            service_file.write(SERVICE_TEMPLATE.substitute(entrypoint=entrypoint))
-
-        logger.info(f"Service file created at {service_file_path}")
+        service_changed = _write_if_changed(service_file_path, render_service(entrypoint))
+        if service_changed:
+            logger.info("Service file created at %s", service_file_path)
 
         # Generate the timer file
         timer_file_path = "/etc/systemd/system/collector.timer"
-        interval = config.get("frequency")
-
-        with open(timer_file_path, "w") as timer_file:
-            timer_file.write(TIMER_TEMPLATE.substitute(interval=interval))
+        interval = config.frequency
 
-        logger.info(f"Timer file created at {timer_file_path}")
+        timer_changed = _write_if_changed(timer_file_path, render_timer(interval))
+        if timer_changed:
+            logger.info("Timer file created at %s", timer_file_path)
 
-        # Reload systemd to recognize the new service and timer
-        run(["systemctl", "daemon-reload"], check=True)
-        logger.info("Systemd daemon reloaded to recognize new service and timer.")
+        return service_changed or timer_changed
     
     @classmethod
     def install_dependencies(cls) -> None:
-        """Install necessary dependencies for the collector."""
-        from subprocess import run
-        
-        run(["apt", "install", "-y", "python3-pip"])
-        run(["pip3", "install", "-r", f"{cls.DEST_DIR}/requirements.txt"], check=True)
+        """Install necessary dependencies for the collector.
+
+        Installation is skipped when the collector's requirements.txt is
+        identical to the one installed last time.
+        """
+        requirements_path = os.path.join(cls.DEST_DIR, "requirements.txt")
+        with open(requirements_path, "rb") as requirements_file:
+            digest = hashlib.blake2b(requirements_file.read(), digest_size=16).hexdigest()
+
+        try:
+            with open(cls.REQUIREMENTS_HASH_FILE, "r") as hash_file:
+                installed_digest = hash_file.read().strip()
+        except FileNotFoundError:
+            installed_digest = None
+
+        if digest == installed_digest:
+            logger.info("Requirements unchanged, skipping dependency installation.")
+            return
+
+        # python3-pip itself is installed by the charm's install hook
+        run_command([
+            "pip3", "install", "--prefer-binary", "--cache-dir", cls.PIP_CACHE_DIR,
+            "-r", requirements_path,
+        ])
+
+        os.makedirs(cls.CONFIG_DIR, exist_ok=True)
+        with _atomic_open(cls.REQUIREMENTS_HASH_FILE) as hash_file:
+            hash_file.write(digest)
@@ -4,55 +4,206 @@
 
 """GitHub repository management for the collector charm."""
 
+import json
 import logging
 import os
-from typing import Dict, Any
+import shutil
+import tarfile
+import tempfile
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Dict, Optional, Tuple
+
+from config import CollectorConfig
+from file_manager import FileManager, _atomic_open
 
 logger = logging.getLogger(__name__)
 
 
 class GitHubClient:
     """Handles GitHub repository operations for the collector charm."""
+
+    # Source ("<repo>@<tag>:<sub-directory>") and ETag of the collector in dest_dir
+    ETAG_FILE = os.path.join(FileManager.CONFIG_DIR, "etag.json")
     
     @staticmethod
-    def fetch_collector(config: Dict[str, Any], dest_dir: str = "/opt/collector") -> None:
+    def fetch_collector(config: CollectorConfig, dest_dir: str = "/opt/collector") -> None:
         """Fetch the collector from GitHub repository.
+
+        The download is skipped when GitHub reports, via a conditional request
+        on the tag's commit, that nothing changed since the last fetch.
         
         Args:
-            config: Configuration dictionary containing GitHub settings
+            config: Configuration containing GitHub settings
             dest_dir: Destination directory for the collector files
+
+        Raises:
+            ValueError: If the repository, token or release tag is not set
         """
-        from subprocess import run
-        
-        token = config.get("github_token")
-        repo_url = config.get("github_repo")
-        tag = config.get("release_tag")
-        subdir = config.get("sub_directory")
-        clone_dir = "/tmp/collector-repo"
+        token = config.github_token
+        repo_url = config.github_repo
+        tag = config.release_tag
+        subdir = config.sub_directory
+        if not (token and repo_url and tag):
+            raise ValueError("github-repo, github-token and release-tag are required to fetch")
+
+        parsed_url = urllib.parse.urlsplit(repo_url)
+        owner, repo = parsed_url.path.strip("/").removesuffix(".git").split("/")[:2]
+        if parsed_url.netloc == "github.com":
+            api_base = "https://api.github.com"
+        else:
+            api_base = f"https://{parsed_url.netloc}/api/v3"
+        repo_api = f"{api_base}/repos/{owner}/{repo}"
+        quoted_tag = urllib.parse.quote(tag)
 
-        # Insert token into repo URL
-        parts = repo_url.split("https://", 1)[1]
-        authed_url = f"https://oauth2:{token}@{parts}"
+        # Skip the download if dest_dir holds this source and the tag still
+        # points at the commit that was fetched into it
+        source = f"{repo_url}@{tag}:{subdir or ''}"
+        fetched = GitHubClient._read_fetched()
+        stored_etag = None
+        if fetched.get("source") == source and os.path.isdir(dest_dir):
+            stored_etag = fetched.get("etag")
+        modified, etag = GitHubClient._fetch_with_etag(
+            f"{repo_api}/commits/{quoted_tag}", token, stored_etag
+        )
+        if not modified:
+            logger.info("Collector %s is unchanged on GitHub, keeping %s.", tag, dest_dir)
+            return
 
         logger.info("Fetching collector from GitHub...")
 
-        # Clean up if needed
-        run(["rm", "-rf", clone_dir], check=True)
+        # Extract next to dest_dir, on the same filesystem, so the working
+        # collector is only replaced, by a rename, once the fetch succeeded
+        parent_dir = os.path.dirname(os.path.abspath(dest_dir))
+        os.makedirs(parent_dir, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(dir=parent_dir, prefix=".collector-")
+        try:
+            tarball_url = f"{repo_api}/tarball/{quoted_tag}"
+            GitHubClient._extract_tarball(tarball_url, token, subdir, staging_dir)
+            # mkdtemp creates the directory as 0o700, but the collector runs as ubuntu
+            os.chmod(staging_dir, 0o755)
+
+            # dest_dir no longer matches the record once its files are replaced
+            GitHubClient._store_fetched({})
+            GitHubClient._replace_dir(staging_dir, dest_dir)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+        if etag:
+            GitHubClient._store_fetched({"source": source, "etag": etag})
 
-        # Clone with sparse-checkout from a tag
-        run([
-            "git", "clone", "--depth=1", "--filter=blob:none", "--sparse", "--branch", tag,
-            authed_url, clone_dir
-        ], check=True)
+        logger.info("Collector fetched to %s successfully.", dest_dir)
 
-        if subdir:  # If a sub-directory is specified, set sparse-checkout to that directory
-            logger.info(f"Setting sparse-checkout to sub-directory: {subdir}")
-            run(["git", "-C", clone_dir, "sparse-checkout", "set", subdir], check=True)
+    @staticmethod
+    def _fetch_with_etag(url: str, token: str, etag: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """Ask GitHub whether the resource at ``url`` changed since ``etag``.
+
+        Args:
+            url: GitHub API URL of the resource
+            token: GitHub token used to authenticate the request
+            etag: ETag returned by the previous request, if any
+
+        Returns:
+            Whether the resource changed (or could not be checked), and its current ETag
+        """
+        headers = {
+            "Accept": "application/vnd.github.sha",
+            "Authorization": f"token {token}",
+        }
+        if etag:
+            headers["If-None-Match"] = etag
 
-        run(["rm", "-rf", dest_dir], check=True)
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return True, response.headers.get("ETag")
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return False, etag
+            logger.warning("Could not check %s for changes: %s", url, e)
+        except urllib.error.URLError as e:
+            logger.warning("Could not check %s for changes: %s", url, e)
+        return True, None
 
-        logger.info(f"Copying files from {clone_dir}/{subdir} to {dest_dir}...")
-        os.makedirs(dest_dir, exist_ok=True)
-        run(["cp", "-r", f"{clone_dir}/{subdir}/.", dest_dir], check=True)
+    @staticmethod
+    def _extract_tarball(url: str, token: str, subdir: Optional[str], target_dir: str) -> None:
+        """Stream a GitHub source tarball and extract (a sub-directory of) it.
 
-        logger.info("Collector fetched and copied successfully.")
+        Args:
+            url: GitHub API URL of the tarball
+            token: GitHub token used to authenticate the request
+            subdir: Only extract this sub-directory of the repository, if set
+            target_dir: Directory the repository (or sub-directory) contents end up in
+        """
+        prefix = f"{subdir.strip('/')}/" if subdir else ""
+        extracted = False
+        request = urllib.request.Request(url, headers={"Authorization": f"token {token}"})
+
+        with urllib.request.urlopen(request, timeout=300) as response, \
+                tarfile.open(fileobj=response, mode="r|gz") as tar:
+            has_data_filter = hasattr(tarfile, "data_filter")
+            if has_data_filter:
+                tar.extraction_filter = tarfile.data_filter
+
+            for member in tar:
+                # Every entry sits below a single "<owner>-<repo>-<sha>/" directory
+                _, _, path = member.name.partition("/")
+                if not path.startswith(prefix) or path == prefix:
+                    continue
+                path = path[len(prefix):]
+
+                if os.path.isabs(path) or ".." in path.split("/"):
+                    raise ValueError(f"Refusing to extract unsafe path {member.name!r}")
+                if not (member.isfile() or member.isdir() or member.issym()):
+                    continue
+                # Without the data filter nothing stops a link pointing out of target_dir
+                if member.issym() and not has_data_filter and (
+                    os.path.isabs(member.linkname) or ".." in member.linkname.split("/")
+                ):
+                    raise ValueError(f"Refusing to extract unsafe link {member.name!r}")
+
+                member.name = path
+                tar.extract(member, target_dir)
+                extracted = True
+
+        if not extracted:
+            raise FileNotFoundError(f"{subdir or 'Repository root'} not found in {url}")
+
+    @staticmethod
+    def _replace_dir(new_dir: str, dest_dir: str) -> None:
+        """Move ``new_dir`` to ``dest_dir``, removing whatever was there before.
+
+        Both directories must be on the same filesystem.
+        """
+        old_dir = f"{new_dir}.old"
+        try:
+            os.rename(dest_dir, old_dir)
+        except FileNotFoundError:
+            old_dir = None
+
+        try:
+            os.rename(new_dir, dest_dir)
+        except OSError:
+            if old_dir:
+                os.rename(old_dir, dest_dir)
+            raise
+
+        if old_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+    @staticmethod
+    def _read_fetched() -> Dict[str, str]:
+        """Read the record of the collector in dest_dir, empty dict if there is none."""
+        try:
+            with open(GitHubClient.ETAG_FILE, "r") as etag_file:
+                return json.load(etag_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    @staticmethod
+    def _store_fetched(fetched: Dict[str, str]) -> None:
+        """Replace the record of the collector in dest_dir."""
+        os.makedirs(os.path.dirname(GitHubClient.ETAG_FILE), exist_ok=True)
+        with _atomic_open(GitHubClient.ETAG_FILE) as etag_file:
+            json.dump(fetched, etag_file, separators=(",", ":"))
@@ -5,10 +5,13 @@
 """Service management for the collector charm."""
 
 import logging
-from subprocess import run
+
+from commands import run_command
 
 logger = logging.getLogger(__name__)
 
+UNITS = ["collector.service", "collector.timer"]
+
 
 class ServiceManager:
     """Handles systemd service operations for the collector charm."""
@@ -21,50 +24,42 @@ class ServiceManager:
         """
         self.set_status = unit_status_setter
     
-    def start_service(self) -> None:
-        """Start the collector service and timer."""
-        
-        # Start the service
+    def start_service(self, reload_units: bool = False) -> None:
+        """Start and enable the collector service and timer.
+
+        Args:
+            reload_units: Reload the systemd daemon first because the unit files changed
+        """
         logger.info("Starting collector service and timer...")
-        run(["systemctl", "start", "collector.service"], check=True)
-        run(["systemctl", "enable", "collector.service"], check=True)
-        
-        # Start the timer as well
-        run(["systemctl", "start", "collector.timer"], check=True)
-        run(["systemctl", "enable", "collector.timer"], check=True)
+        if reload_units:
+            self.reload_daemon()
+
+        run_command(["systemctl", "enable", "--now", *UNITS])
         logger.info("Collector service and timer started successfully.")
 
     def stop_service(self) -> None:
-        """Stop the collector service and timer."""
-        
-        # Stop the service
+        """Stop and disable the collector service and timer."""
         logger.info("Stopping collector service and timer...")
-        run(["systemctl", "stop", "collector.service"])
-        run(["systemctl", "disable", "collector.service"])
-
-        # Stop the timer as well
-        run(["systemctl", "stop", "collector.timer"])
-        run(["systemctl", "disable", "collector.timer"])
+        run_command(["systemctl", "disable", "--now", *UNITS], check=False)
         logger.info("Collector service and timer stopped successfully.")
 
     def reload_daemon(self) -> None:
         """Reload the systemd daemon to apply changes."""
         logger.info("Reloading systemd daemon...")
-        run(["systemctl", "daemon-reload"], check=True)
+        run_command(["systemctl", "daemon-reload"])
         logger.info("Systemd daemon reloaded successfully.")
     
-    def restart_service(self) -> None:
-        """Restart the collector service and timer."""
-        
+    def restart_service(self, reload_units: bool = False) -> None:
+        """Restart the collector service and timer.
+
+        Args:
+            reload_units: Reload the systemd daemon and re-enable the units
+                because the unit files changed
+        """
         logger.info("Restarting collector service and timer...")
-        self.reload_daemon()
-        
-        # Restart the service
-        run(["systemctl", "restart", "collector.service"], check=True)
-        run(["systemctl", "enable", "collector.service"], check=True)
-        
-        # Restart the timer as well
-        run(["systemctl", "restart", "collector.timer"], check=True)
-        run(["systemctl", "enable", "collector.timer"], check=True)
-        
+        if reload_units:
+            self.reload_daemon()
+            run_command(["systemctl", "enable", *UNITS])
+
+        run_command(["systemctl", "restart", *UNITS])
         logger.info("Collector service and timer restarted successfully.")
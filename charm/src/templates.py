@@ -4,8 +4,6 @@
 
 """Service and timer templates for the collector."""
 
-from string import Template
-
 SERVICE_TEMPLATE_STRING = \
 """
 [Unit]
@@ -23,8 +21,6 @@ Type=oneshot
 WantedBy=multi-user.target
 """
 
-SERVICE_TEMPLATE = Template(SERVICE_TEMPLATE_STRING)
-
 TIMER_TEMPLATE_STRING = \
 """
 [Unit]
@@ -39,4 +35,28 @@ Unit=collector.service
 WantedBy=multi-user.target
 """
 
-TIMER_TEMPLATE = Template(TIMER_TEMPLATE_STRING)
+# Split and encode the templates once at import so rendering only encodes the value
+_SERVICE_PRE, _SERVICE_POST = (
+    part.encode() for part in SERVICE_TEMPLATE_STRING.split("${entrypoint}", 1)
+)
+_TIMER_PRE, _TIMER_POST = (
+    part.encode() for part in TIMER_TEMPLATE_STRING.split("${interval}", 1)
+)
+
+
+def render_service(entrypoint: str) -> bytes:
+    """Render the collector service unit file.
+
+    Args:
+        entrypoint: Command line used as the service's ExecStart
+    """
+    return b"".join((_SERVICE_PRE, entrypoint.encode(), _SERVICE_POST))
+
+
+def render_timer(interval) -> bytes:
+    """Render the collector timer unit file.
+
+    Args:
+        interval: Number of seconds between collector runs
+    """
+    return b"".join((_TIMER_PRE, str(interval).encode(), _TIMER_POST))
@@ -3,10 +3,29 @@
 #
 # To learn more about testing, see https://ops.readthedocs.io/en/latest/explanation/testing.html
 
+from dataclasses import asdict
+
+import ops
 import pytest
 from ops import testing
 
 from charm import CollectorCharm
+from config import CollectorConfig, ConfigManager
+from file_manager import FileManager
+from github_client import GitHubClient
+from service_manager import ServiceManager
+
+CONFIG = {
+    "collector-name": "collector",
+    "haproxy-name": "haproxy",
+    "haproxy-url": "http://haproxy.local:8404/stats",
+    "haproxy-username": "admin",
+    "haproxy-password": "secret",
+    "github-repo": "https://github.com/owner/repo",
+    "github-token": "token",
+    "release-tag": "v1",
+    "frequency": 600,
+}
 
 
 def mock_get_version():
@@ -24,3 +43,191 @@ def test_start(monkeypatch: pytest.MonkeyPatch):
     # Assert:
     assert state_out.workload_version is not None
     assert state_out.unit_status == testing.ActiveStatus()
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Record the service, file and GitHub operations instead of running them."""
+    calls = []
+
+    def record(name, result=None):
+        def method(*args, **kwargs):
+            calls.append((name, kwargs))
+            return result
+        return method
+
+    for name in ("start_service", "stop_service", "restart_service"):
+        monkeypatch.setattr(ServiceManager, name, record(name))
+    for name in ("store_config", "generate_environment_file", "install_dependencies"):
+        monkeypatch.setattr(FileManager, name, staticmethod(record(name)))
+    monkeypatch.setattr(
+        FileManager, "generate_service_file", staticmethod(record("generate_service_file", True))
+    )
+    monkeypatch.setattr(FileManager, "read_config", staticmethod(lambda: {}))
+    monkeypatch.setattr(GitHubClient, "fetch_collector", staticmethod(record("fetch_collector")))
+    return calls
+
+
+def units_dirty(state):
+    return state.get_stored_state("_stored", owner_path="CollectorCharm").content["units_dirty"]
+
+
+def reloaded_units(calls):
+    """Return whether the units were started or restarted with a daemon reload."""
+    return [
+        kwargs.get("reload_units", False)
+        for name, kwargs in calls
+        if name in ("start_service", "restart_service")
+    ]
+
+
+def test_reload_reloads_rewritten_units(calls):
+    """Test that reload reloads systemd for the rewritten units and clears the flag."""
+    # Arrange:
+    ctx = testing.Context(CollectorCharm)
+    # Act:
+    state_out = ctx.run(ctx.on.action("reload"), testing.State(config=CONFIG))
+    # Assert:
+    assert reloaded_units(calls) == [True]
+    assert units_dirty(state_out) is False
+
+
+def test_config_changed_does_not_store_failed_change(calls, monkeypatch):
+    """Test that a change whose fetch failed is not stored, so it is retried."""
+    # Arrange:
+    def fail(*args, **kwargs):
+        raise RuntimeError("GitHub is down")
+
+    monkeypatch.setattr(GitHubClient, "fetch_collector", staticmethod(fail))
+    ctx = testing.Context(CollectorCharm)
+    # Act:
+    state_out = ctx.run(ctx.on.config_changed(), testing.State(config=CONFIG))
+    # Assert:
+    assert "store_config" not in [name for name, _ in calls]
+    assert state_out.unit_status == testing.BlockedStatus(
+        "Failed to fetch collector: GitHub is down"
+    )
+
+
+def test_set_status_skips_unchanged_status():
+    """Test that a status equal to the current one is not written again."""
+    # Arrange:
+    ctx = testing.Context(CollectorCharm)
+    # Act:
+    with ctx(ctx.on.update_status(), testing.State()) as manager:
+        manager.charm._set_status(ops.MaintenanceStatus("Restarting service..."))
+        manager.charm._set_status(ops.MaintenanceStatus("Restarting service..."))
+        manager.charm._set_status(ops.ActiveStatus("Running"))
+        state_out = manager.run()
+    # Assert:
+    assert ctx.unit_status_history == [
+        testing.UnknownStatus(),
+        testing.MaintenanceStatus("Restarting service..."),
+    ]
+    assert state_out.unit_status == testing.ActiveStatus("Running")
+
+
+@pytest.mark.parametrize("action", ["start", "restart"])
+@pytest.mark.parametrize("dirty", [True, False])
+def test_dirty_units_reloaded_on_start_and_restart(calls, action, dirty):
+    """Test that systemd is only reloaded when the unit files changed."""
+    # Arrange:
+    ctx = testing.Context(CollectorCharm)
+    stored = testing.StoredState(owner_path="CollectorCharm", content={"units_dirty": dirty})
+    # Act:
+    state_out = ctx.run(ctx.on.action(action), testing.State(stored_states={stored}))
+    # Assert:
+    assert reloaded_units(calls) == [dirty]
+    assert units_dirty(state_out) is False
+    assert state_out.unit_status == testing.ActiveStatus("Running")
+
+
+def test_diff_config_returns_changed_fields():
+    """Test that only the fields differing from the stored config are reported."""
+    # Arrange:
+    old_config = {"frequency": 600, "release_tag": "v1", "sub_directory": "collector"}
+    new_config = CollectorConfig(frequency=600, release_tag="v2")
+    # Act:
+    changed = CollectorCharm._diff_config(old_config, new_config)
+    # Assert:
+    assert changed == {"release_tag", "sub_directory"}
+
+
+def test_diff_config_against_missing_stored_config():
+    """Test that every set field counts as changed when nothing was stored yet."""
+    # Act:
+    changed = CollectorCharm._diff_config({}, CollectorConfig(release_tag="v1"))
+    # Assert:
+    assert changed == {"frequency", "release_tag"}
+
+
+def test_stop_marks_units_dirty(calls):
+    """Test that the disabled units are enabled and reloaded again on the next restart."""
+    # Arrange:
+    ctx = testing.Context(CollectorCharm)
+    # Act:
+    state_out = ctx.run(ctx.on.action("stop"), testing.State())
+    # Assert:
+    assert units_dirty(state_out) is True
+    assert state_out.unit_status == testing.BlockedStatus("Stopped")
+
+
+@pytest.mark.parametrize("dirty", [True, False])
+def test_reload_with_unchanged_units(calls, monkeypatch, dirty):
+    """Test that reload only reloads systemd for unchanged units if they were dirty."""
+    # Arrange:
+    monkeypatch.setattr(FileManager, "generate_service_file", staticmethod(lambda config: False))
+    ctx = testing.Context(CollectorCharm)
+    stored = testing.StoredState(owner_path="CollectorCharm", content={"units_dirty": dirty})
+    state = testing.State(config=CONFIG, stored_states={stored})
+    # Act:
+    state_out = ctx.run(ctx.on.action("reload"), state)
+    # Assert:
+    assert reloaded_units(calls) == [dirty]
+    assert units_dirty(state_out) is False
+
+
+def called(calls):
+    return [name for name, _ in calls]
+
+
+@pytest.mark.parametrize("stored, fetched", [({}, True), (CONFIG, False)])
+def test_reload_installs_dependencies_with_or_without_fetch(
+    calls, monkeypatch, tmp_path, stored, fetched
+):
+    """Test that reload only fetches a changed collector but always installs its requirements."""
+    # Arrange:
+    stored_config = asdict(ConfigManager(stored).get_config()) if stored else {}
+    monkeypatch.setattr(FileManager, "read_config", staticmethod(lambda: stored_config))
+    monkeypatch.setattr(FileManager, "DEST_DIR", str(tmp_path))
+    ctx = testing.Context(CollectorCharm)
+    # Act:
+    state_out = ctx.run(ctx.on.action("reload"), testing.State(config=CONFIG))
+    # Assert:
+    assert ("fetch_collector" in called(calls)) is fetched
+    assert "install_dependencies" in called(calls)
+    assert state_out.unit_status == testing.ActiveStatus("Running")
+
+
+def test_config_changed_installs_dependencies_after_fetch(calls):
+    """Test that a new release tag installs the requirements of the fetched collector."""
+    # Arrange:
+    ctx = testing.Context(CollectorCharm)
+    # Act:
+    ctx.run(ctx.on.config_changed(), testing.State(config=CONFIG))
+    # Assert:
+    names = called(calls)
+    assert names.index("fetch_collector") < names.index("install_dependencies")
+    assert names.index("install_dependencies") < names.index("store_config")
+
+
+@pytest.mark.parametrize("event", ["config_changed", "reload"])
+def test_applied_config_stored_durably(calls, event):
+    """Test that the configuration recording an applied change is fsync'ed."""
+    # Arrange:
+    ctx = testing.Context(CollectorCharm)
+    trigger = ctx.on.config_changed() if event == "config_changed" else ctx.on.action("reload")
+    # Act:
+    ctx.run(trigger, testing.State(config=CONFIG))
+    # Assert:
+    assert [kwargs for name, kwargs in calls if name == "store_config"] == [{"durable": True}]
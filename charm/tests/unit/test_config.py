@@ -0,0 +1,102 @@
+# Copyright 2025 Alhassan Ibrahim
+# See LICENSE file for licensing details.
+
+from dataclasses import replace
+
+import pytest
+
+from config import CollectorConfig, ConfigValidator
+
+VALID_CONFIG = CollectorConfig(
+    frequency=600,
+    collector_name="collector",
+    haproxy_name="haproxy",
+    haproxy_url="http://haproxy.local:8404/stats",
+    haproxy_username="admin",
+    haproxy_password="secret",
+    github_repo="https://github.com/owner/repo",
+    github_token="token",
+    release_tag="v1",
+)
+
+REQUIRED_OPTIONS = [
+    ("frequency", "frequency"),
+    ("collector_name", "collector-name"),
+    ("haproxy_name", "haproxy-name"),
+    ("haproxy_url", "haproxy-url"),
+    ("haproxy_username", "haproxy-username"),
+    ("haproxy_password", "haproxy-password"),
+    ("github_repo", "github-repo"),
+    ("github_token", "github-token"),
+    ("release_tag", "release-tag"),
+]
+
+
+def test_validate_config_accepts_valid_config():
+    """Test that a complete configuration passes validation."""
+    # Act / Assert:
+    ConfigValidator.validate_config(VALID_CONFIG)
+
+
+@pytest.mark.parametrize("field, option", REQUIRED_OPTIONS)
+def test_validate_config_requires_option(field, option):
+    """Test that every required option is reported by its charm option name."""
+    # Arrange:
+    config = replace(VALID_CONFIG, **{field: 0 if field == "frequency" else None})
+    # Act / Assert:
+    with pytest.raises(ValueError, match=f"^The '{option}' configuration option is required.$"):
+        ConfigValidator.validate_config(config)
+
+
+def test_validate_config_reports_required_options_in_order():
+    """Test that missing options are reported in option order, before URL checks."""
+    # Arrange:
+    config = CollectorConfig()
+    errors = []
+    # Act:
+    for field, _ in REQUIRED_OPTIONS[1:]:
+        try:
+            ConfigValidator.validate_config(config)
+        except ValueError as e:
+            errors.append(str(e))
+        config = replace(config, **{field: getattr(VALID_CONFIG, field)})
+    # Assert:
+    assert errors == [
+        f"The '{option}' configuration option is required." for _, option in REQUIRED_OPTIONS[1:]
+    ]
+    ConfigValidator.validate_config(config)
+
+
+def test_validate_config_checks_url_after_required_options():
+    """Test that an invalid URL is only reported once all required options are set."""
+    # Arrange:
+    config = replace(VALID_CONFIG, github_repo="git@github.com:owner/repo", release_tag=None)
+    # Act / Assert:
+    with pytest.raises(ValueError, match="'release-tag' configuration option is required"):
+        ConfigValidator.validate_config(config)
+
+
+def test_validate_config_rejects_plain_http_github_repo():
+    """Test that the collector repository must be fetched over HTTPS."""
+    # Arrange:
+    config = replace(VALID_CONFIG, github_repo="http://github.com/owner/repo")
+    # Act / Assert:
+    with pytest.raises(ValueError, match="'github-repo' must be a valid HTTPS URL"):
+        ConfigValidator.validate_config(config)
+
+
+@pytest.mark.parametrize("url", ["httpfoo", "http:/haproxy.local", "ftp://haproxy.local"])
+def test_validate_config_rejects_non_http_haproxy_url(url):
+    """Test that the HAProxy URL needs an http:// or https:// scheme."""
+    # Arrange:
+    config = replace(VALID_CONFIG, haproxy_url=url)
+    # Act / Assert:
+    with pytest.raises(ValueError, match="'haproxy-url' must be a valid URL"):
+        ConfigValidator.validate_config(config)
+
+
+@pytest.mark.parametrize("url", ["http://haproxy.local", "https://haproxy.local"])
+def test_validate_config_accepts_http_haproxy_url(url):
+    """Test that both plain and TLS HAProxy stats endpoints are accepted."""
+    # Act / Assert:
+    ConfigValidator.validate_config(replace(VALID_CONFIG, haproxy_url=url))
@@ -0,0 +1,164 @@
+# Copyright 2025 Alhassan Ibrahim
+# See LICENSE file for licensing details.
+
+import os
+
+import pytest
+
+import file_manager
+from config import CollectorConfig
+from file_manager import FileManager, _write_if_changed
+
+
+@pytest.fixture
+def config_file(monkeypatch, tmp_path):
+    path = tmp_path / "config.json"
+    monkeypatch.setattr(FileManager, "CONFIG_FILE", str(path))
+    monkeypatch.setattr(FileManager, "_config_cache", (None, None))
+    return path
+
+
+def test_read_config_cached_until_modified(config_file):
+    """Test that the stored config is only parsed again once its mtime changed."""
+    # Arrange:
+    config_file.write_text('{"release_tag": "v1"}')
+    mtime = config_file.stat().st_mtime_ns
+    first = FileManager.read_config()
+    # Rewrite the file but keep its mtime, so only the cache can return v1
+    config_file.write_text('{"release_tag": "v2"}')
+    os.utime(config_file, ns=(mtime, mtime))
+    # Act:
+    cached = FileManager.read_config()
+    os.utime(config_file, ns=(mtime + 1, mtime + 1))
+    reread = FileManager.read_config()
+    # Assert:
+    assert first == cached == {"release_tag": "v1"}
+    assert reread == {"release_tag": "v2"}
+
+
+def test_read_config_returns_copies(config_file):
+    """Test that changing a returned config does not change the cached one."""
+    # Arrange:
+    config_file.write_text('{"release_tag": "v1"}')
+    # Act:
+    FileManager.read_config()["release_tag"] = "changed"
+    # Assert:
+    assert FileManager.read_config() == {"release_tag": "v1"}
+
+
+def test_read_config_missing_file(config_file):
+    """Test that a missing config file reads as an empty config."""
+    # Act / Assert:
+    assert FileManager.read_config() == {}
+
+
+@pytest.fixture
+def commands_run(monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(file_manager, "run_command", lambda args, **kwargs: calls.append(args))
+    monkeypatch.setattr(FileManager, "DEST_DIR", str(tmp_path / "collector"))
+    monkeypatch.setattr(FileManager, "CONFIG_DIR", str(tmp_path / ".collector"))
+    monkeypatch.setattr(
+        FileManager, "REQUIREMENTS_HASH_FILE", str(tmp_path / ".collector" / "requirements.hash")
+    )
+    (tmp_path / "collector").mkdir()
+    return calls
+
+
+def test_install_dependencies_skips_unchanged_requirements(commands_run, tmp_path):
+    """Test that pip only runs again once requirements.txt changed."""
+    # Arrange:
+    requirements = tmp_path / "collector" / "requirements.txt"
+    requirements.write_text("requests\n")
+    FileManager.install_dependencies()
+    # Act:
+    FileManager.install_dependencies()
+    requirements.write_text("requests\nurllib3\n")
+    FileManager.install_dependencies()
+    # Assert:
+    assert [args[0] for args in commands_run].count("pip3") == 2
+
+
+def test_write_if_changed_skips_identical_content(tmp_path):
+    """Test that a file already holding the data is left untouched."""
+    # Arrange:
+    path = tmp_path / "collector.service"
+    path.write_bytes(b"content")
+    inode = path.stat().st_ino
+    # Act:
+    written = _write_if_changed(str(path), b"content")
+    # Assert:
+    assert not written
+    assert path.stat().st_ino == inode
+
+
+def test_write_if_changed_replaces_changed_content(tmp_path):
+    """Test that changed data replaces the file."""
+    # Arrange:
+    path = tmp_path / "collector.service"
+    path.write_bytes(b"content")
+    # Act:
+    written = _write_if_changed(str(path), b"changed")
+    # Assert:
+    assert written
+    assert path.read_bytes() == b"changed"
+
+
+def test_store_config_skips_unchanged_config(config_file, monkeypatch):
+    """Test that storing the configuration already on disk does not rewrite it."""
+    # Arrange:
+    monkeypatch.setattr(FileManager, "CONFIG_DIR", str(config_file.parent))
+    FileManager.store_config(CollectorConfig(release_tag="v1"))
+    inode = config_file.stat().st_ino
+    # Act:
+    FileManager.store_config(CollectorConfig(release_tag="v1"))
+    # Assert:
+    assert config_file.stat().st_ino == inode
+
+
+def test_write_if_changed_keeps_mode_of_replaced_file(tmp_path):
+    """Test that a replaced file keeps the mode an operator gave it."""
+    # Arrange:
+    path = tmp_path / "collector.service"
+    path.write_bytes(b"content")
+    os.chmod(path, 0o640)
+    # Act:
+    _write_if_changed(str(path), b"changed")
+    # Assert:
+    assert path.stat().st_mode & 0o777 == 0o640
+
+
+def test_write_if_changed_creates_file_with_permissions(tmp_path):
+    """Test that a new file is created with the requested permissions."""
+    # Arrange:
+    path = tmp_path / "collector_envs"
+    # Act:
+    _write_if_changed(str(path), b"HAPROXY_PASSWORD=secret\n", permissions=0o600)
+    # Assert:
+    assert path.stat().st_mode & 0o777 == 0o600
+
+
+@pytest.mark.parametrize("data", [b"HAPROXY_PASSWORD=secret\n", b"HAPROXY_PASSWORD=changed\n"])
+def test_write_if_changed_applies_permissions_to_existing_file(tmp_path, data):
+    """Test that an existing world-readable file gets the requested permissions."""
+    # Arrange:
+    path = tmp_path / "collector_envs"
+    path.write_bytes(b"HAPROXY_PASSWORD=secret\n")
+    os.chmod(path, 0o644)
+    # Act:
+    _write_if_changed(str(path), data, permissions=0o600)
+    # Assert:
+    assert path.stat().st_mode & 0o777 == 0o600
+    assert path.read_bytes() == data
+
+
+def test_store_config_restricts_existing_config(config_file, monkeypatch):
+    """Test that a stored config holding the GitHub token is made private."""
+    # Arrange:
+    monkeypatch.setattr(FileManager, "CONFIG_DIR", str(config_file.parent))
+    FileManager.store_config(CollectorConfig(github_token="token"))
+    os.chmod(config_file, 0o644)
+    # Act:
+    FileManager.store_config(CollectorConfig(github_token="token"))
+    # Assert:
+    assert config_file.stat().st_mode & 0o777 == 0o600
@@ -0,0 +1,245 @@
+# Copyright 2025 Alhassan Ibrahim
+# See LICENSE file for licensing details.
+
+import io
+import tarfile
+import urllib.error
+import urllib.request
+
+import pytest
+
+from config import CollectorConfig
+from github_client import GitHubClient
+
+TARBALL_URL = "https://api.github.com/repos/owner/repo/tarball/v1"
+
+
+def make_tarball(files, symlinks=None):
+    """Build a gzipped tarball of ``files`` and ``symlinks``, keyed by member name."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for name, content in files.items():
+            data = content.encode()
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+        for name, target in (symlinks or {}).items():
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.SYMTYPE
+            info.linkname = target
+            tar.addfile(info)
+    return buffer.getvalue()
+
+
+class FakeResponse(io.BytesIO):
+    def __init__(self, data=b"", headers=None):
+        super().__init__(data)
+        self.headers = headers or {}
+
+
+class FakeGitHub:
+    """Serves the commits and tarball endpoints of a single repository."""
+
+    def __init__(self):
+        # tag -> (ETag, tarball)
+        self.tags = {}
+        self.tarball_requests = 0
+        self.fail_tarballs = False
+
+    def publish(self, tag, files, symlinks=None):
+        self.tags[tag] = (f'"{tag}-{len(self.tags)}"', make_tarball(files, symlinks))
+
+    def urlopen(self, request, timeout=None):
+        _, kind, tag = request.full_url.rsplit("/", 2)
+        etag, tarball = self.tags[tag]
+        if kind == "commits":
+            if request.get_header("If-none-match") == etag:
+                raise urllib.error.HTTPError(request.full_url, 304, "Not Modified", {}, None)
+            return FakeResponse(headers={"ETag": etag})
+
+        self.tarball_requests += 1
+        if self.fail_tarballs:
+            raise urllib.error.URLError("connection reset")
+        return FakeResponse(tarball)
+
+
+@pytest.fixture
+def github(monkeypatch, tmp_path):
+    fake = FakeGitHub()
+    monkeypatch.setattr(urllib.request, "urlopen", fake.urlopen)
+    monkeypatch.setattr(GitHubClient, "ETAG_FILE", str(tmp_path / ".collector" / "etag.json"))
+    return fake
+
+
+def make_config(tag):
+    return CollectorConfig(
+        github_repo="https://github.com/owner/repo",
+        github_token="token",
+        release_tag=tag,
+        sub_directory="collector",
+    )
+
+
+def test_extract_tarball_strips_prefixes(github, tmp_path):
+    """Test that only the sub-directory is extracted, without its leading directories."""
+    # Arrange:
+    github.publish("v1", {
+        "owner-repo-abc/README.md": "readme",
+        "owner-repo-abc/collector/main.py": "main",
+        "owner-repo-abc/collector/lib/util.py": "util",
+    })
+    target = tmp_path / "target"
+    # Act:
+    GitHubClient._extract_tarball(TARBALL_URL, "token", "collector", str(target))
+    # Assert:
+    assert (target / "main.py").read_text() == "main"
+    assert (target / "lib" / "util.py").read_text() == "util"
+    assert not (target / "README.md").exists()
+
+
+@pytest.mark.parametrize(
+    "name, subdir",
+    [
+        ("owner-repo-abc/collector/../../escaped.py", "collector"),
+        ("owner-repo-abc//tmp/escaped.py", None),
+    ],
+)
+def test_extract_tarball_rejects_unsafe_paths(github, tmp_path, name, subdir):
+    """Test that members escaping the target directory are refused."""
+    # Arrange:
+    github.publish("v1", {name: "evil"})
+    target = tmp_path / "a" / "target"
+    # Act / Assert:
+    with pytest.raises(ValueError):
+        GitHubClient._extract_tarball(TARBALL_URL, "token", subdir, str(target))
+    assert not list(tmp_path.rglob("escaped.py"))
+
+
+@pytest.mark.parametrize("target", ["/etc/passwd", "../../../etc/passwd", "lib/../../etc"])
+def test_extract_tarball_rejects_unsafe_links_without_data_filter(
+    github, monkeypatch, tmp_path, target
+):
+    """Test that links out of the target directory are refused on Pythons without data_filter."""
+    # Arrange:
+    monkeypatch.delattr(tarfile, "data_filter", raising=False)
+    github.publish(
+        "v1",
+        {"owner-repo-abc/collector/main.py": "main"},
+        symlinks={"owner-repo-abc/collector/link": target},
+    )
+    target_dir = tmp_path / "target"
+    # Act / Assert:
+    with pytest.raises(ValueError):
+        GitHubClient._extract_tarball(TARBALL_URL, "token", "collector", str(target_dir))
+    assert not (target_dir / "link").is_symlink()
+
+
+def test_extract_tarball_keeps_internal_links_without_data_filter(github, monkeypatch, tmp_path):
+    """Test that links staying inside the target directory are still extracted."""
+    # Arrange:
+    monkeypatch.delattr(tarfile, "data_filter", raising=False)
+    github.publish(
+        "v1",
+        {"owner-repo-abc/collector/main.py": "main"},
+        symlinks={"owner-repo-abc/collector/link.py": "main.py"},
+    )
+    target_dir = tmp_path / "target"
+    # Act:
+    GitHubClient._extract_tarball(TARBALL_URL, "token", "collector", str(target_dir))
+    # Assert:
+    assert (target_dir / "link.py").read_text() == "main"
+
+
+def test_extract_tarball_missing_subdir(github, tmp_path):
+    """Test that a sub-directory missing from the tarball is reported."""
+    # Arrange:
+    github.publish("v1", {"owner-repo-abc/other/main.py": "main"})
+    # Act / Assert:
+    with pytest.raises(FileNotFoundError):
+        GitHubClient._extract_tarball(
+            TARBALL_URL, "token", "collector", str(tmp_path / "target")
+        )
+
+
+def test_fetch_skips_unmodified_tag(github, tmp_path):
+    """Test that a tag GitHub reports as not modified is not downloaded again."""
+    # Arrange:
+    github.publish("v1", {"owner-repo-abc/collector/main.py": "v1"})
+    dest_dir = tmp_path / "opt" / "collector"
+    GitHubClient.fetch_collector(make_config("v1"), str(dest_dir))
+    # Act:
+    GitHubClient.fetch_collector(make_config("v1"), str(dest_dir))
+    # Assert:
+    assert github.tarball_requests == 1
+    assert (dest_dir / "main.py").read_text() == "v1"
+
+
+def test_fetch_refetches_missing_collector(github, tmp_path):
+    """Test that the stored ETag is not used once the collector is gone."""
+    # Arrange:
+    github.publish("v1", {"owner-repo-abc/collector/main.py": "v1"})
+    dest_dir = tmp_path / "opt" / "collector"
+    GitHubClient.fetch_collector(make_config("v1"), str(dest_dir))
+    (dest_dir / "main.py").unlink()
+    dest_dir.rmdir()
+    # Act:
+    GitHubClient.fetch_collector(make_config("v1"), str(dest_dir))
+    # Assert:
+    assert (dest_dir / "main.py").read_text() == "v1"
+
+
+def test_fetch_switching_back_to_earlier_tag(github, tmp_path):
+    """Test that switching back to a tag fetched before replaces the files on disk."""
+    # Arrange:
+    github.publish("v1", {"owner-repo-abc/collector/main.py": "v1"})
+    github.publish("v2", {"owner-repo-abc/collector/main.py": "v2"})
+    dest_dir = tmp_path / "opt" / "collector"
+    GitHubClient.fetch_collector(make_config("v1"), str(dest_dir))
+    GitHubClient.fetch_collector(make_config("v2"), str(dest_dir))
+    # Act:
+    GitHubClient.fetch_collector(make_config("v1"), str(dest_dir))
+    # Assert:
+    assert (dest_dir / "main.py").read_text() == "v1"
+
+
+def test_failed_fetch_keeps_collector(github, tmp_path):
+    """Test that a failed download leaves the installed collector in place."""
+    # Arrange:
+    github.publish("v1", {"owner-repo-abc/collector/main.py": "v1"})
+    github.publish("v2", {"owner-repo-abc/collector/main.py": "v2"})
+    dest_dir = tmp_path / "opt" / "collector"
+    GitHubClient.fetch_collector(make_config("v1"), str(dest_dir))
+    github.fail_tarballs = True
+    # Act:
+    with pytest.raises(urllib.error.URLError):
+        GitHubClient.fetch_collector(make_config("v2"), str(dest_dir))
+    # Assert:
+    assert (dest_dir / "main.py").read_text() == "v1"
+    assert [path.name for path in dest_dir.parent.iterdir()] == ["collector"]
+
+
+def test_fetch_replaces_previous_files(github, tmp_path):
+    """Test that files dropped from the new tag do not survive the swap."""
+    # Arrange:
+    github.publish("v1", {
+        "owner-repo-abc/collector/main.py": "v1",
+        "owner-repo-abc/collector/old.py": "old",
+    })
+    github.publish("v2", {"owner-repo-abc/collector/main.py": "v2"})
+    dest_dir = tmp_path / "opt" / "collector"
+    GitHubClient.fetch_collector(make_config("v1"), str(dest_dir))
+    # Act:
+    GitHubClient.fetch_collector(make_config("v2"), str(dest_dir))
+    # Assert:
+    assert sorted(path.name for path in dest_dir.iterdir()) == ["main.py"]
+    assert (dest_dir / "main.py").read_text() == "v2"
+    assert dest_dir.stat().st_mode & 0o777 == 0o755
+    assert [path.name for path in dest_dir.parent.iterdir()] == ["collector"]
+
+
+def test_fetch_requires_repo_token_and_tag(github, tmp_path):
+    """Test that a config without a release tag is refused before contacting GitHub."""
+    # Act / Assert:
+    with pytest.raises(ValueError):
+        GitHubClient.fetch_collector(make_config(None), str(tmp_path / "collector"))
+    assert github.tarball_requests == 0
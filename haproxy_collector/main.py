@@ -3,11 +3,14 @@ import os
 import logging
 from haproxy_service import HAProxyService
 
-haproxy_url = os.getenv("HAPROXY_URL")
-auth_username = os.getenv("HAPROXY_USERNAME")
-auth_password = os.getenv("HAPROXY_PASSWORD")
+REQUIRED_ENV = ("HAPROXY_URL", "HAPROXY_USERNAME", "HAPROXY_PASSWORD")
 
-if not haproxy_url or not auth_username or not auth_password:
+try:
+    haproxy_url, auth_username, auth_password = (os.environ[name] for name in REQUIRED_ENV)
+except KeyError:
+    haproxy_url = auth_username = auth_password = None
+
+if not (haproxy_url and auth_username and auth_password):
     logging.error("Environment variables HAPROXY_URL, HAPROXY_USERNAME, and HAPROXY_PASSWORD must be set.")
     exit(1)
 